@@ -0,0 +1,232 @@
+import os
+import math
+import ipaddress
+import time
+import threading
+import functools
+from collections import OrderedDict
+from flask import current_app, jsonify, request
+
+# Valores por defecto de cada clase de costo:
+# (concurrencia, cola, espera en segundos, tasa en peticiones/s por cliente, ráfaga)
+CLASES_POR_DEFECTO = {
+    'ligera': (8, 16, 2, 10.0, 20),
+    'media': (4, 8, 5, 2.0, 10),
+    'pesada': (1, 2, 10, 0.2, 3),
+}
+
+def _env(nombre, por_defecto, tipo):
+    valor = os.environ.get(nombre)
+    if valor is None or valor == '':
+        return por_defecto
+    try:
+        return tipo(valor)
+    except ValueError:
+        print(f"Valor inválido para {nombre}: {valor}, se usa {por_defecto}")
+        return por_defecto
+
+class LimitadorTasa:
+    """
+    Token bucket por cliente: 'tasa' tokens por segundo con capacidad 'rafaga'
+    """
+    def __init__(self, tasa, rafaga, max_clientes=1024):
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.max_clientes = max_clientes
+        self._cubetas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, cliente):
+        """
+        Consume un token del cliente. Retorna 0 si se admite o los segundos
+        a esperar hasta el próximo token si se rechaza.
+        """
+        if self.tasa <= 0:
+            return 0
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._cubetas.get(cliente, (self.rafaga, ahora))
+            tokens = min(self.rafaga, tokens + (ahora - ultimo) * self.tasa)
+            if tokens >= 1:
+                tokens -= 1
+                espera = 0
+            else:
+                espera = (1 - tokens) / self.tasa
+            self._cubetas[cliente] = (tokens, ahora)
+            self._cubetas.move_to_end(cliente)
+            while len(self._cubetas) > self.max_clientes:
+                self._cubetas.popitem(last=False)
+        return espera
+
+class ClaseCosto:
+    """
+    Límite de concurrencia con cola de espera acotada para una clase de endpoints
+    """
+    def __init__(self, nombre, concurrencia, cola, espera, tasa, rafaga):
+        self.nombre = nombre
+        self.concurrencia = concurrencia
+        self.cola = cola
+        self.espera = espera
+        self.limitador = LimitadorTasa(tasa, rafaga)
+        self._cond = threading.Condition()
+        self.en_curso = 0
+        self.en_cola = 0
+        self.admitidas = 0
+        self.rechazadas_cola = 0
+        self.rechazadas_espera = 0
+        self.rechazadas_tasa = 0
+
+    def consumir_tasa(self, cliente):
+        """
+        Aplica el token bucket del cliente. Retorna los segundos a esperar (0 si se admite)
+        """
+        espera = self.limitador.consumir(cliente)
+        if espera > 0:
+            with self._cond:
+                self.rechazadas_tasa += 1
+        return espera
+
+    def adquirir(self):
+        """
+        Ocupa un lugar de ejecución esperando como máximo 'espera' segundos.
+        Retorna False si la cola está llena o se agotó la espera.
+        """
+        with self._cond:
+            if self.en_curso >= self.concurrencia:
+                if self.en_cola >= self.cola:
+                    self.rechazadas_cola += 1
+                    return False
+                self.en_cola += 1
+                try:
+                    limite = time.monotonic() + self.espera
+                    while self.en_curso >= self.concurrencia:
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            self.rechazadas_espera += 1
+                            return False
+                        self._cond.wait(restante)
+                finally:
+                    self.en_cola -= 1
+            self.en_curso += 1
+            self.admitidas += 1
+            return True
+
+    def liberar(self):
+        with self._cond:
+            self.en_curso -= 1
+            self._cond.notify()
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                'concurrencia': self.concurrencia,
+                'cola': self.cola,
+                'espera_segundos': self.espera,
+                'tasa_por_cliente': self.limitador.tasa,
+                'rafaga_por_cliente': self.limitador.rafaga,
+                'en_curso': self.en_curso,
+                'en_cola': self.en_cola,
+                'admitidas': self.admitidas,
+                'rechazadas_cola': self.rechazadas_cola,
+                'rechazadas_espera': self.rechazadas_espera,
+                'rechazadas_tasa': self.rechazadas_tasa
+            }
+
+class ControlAdmision:
+    """
+    Control de admisión por clase de costo configurable con variables de entorno
+    ADMISION_<CLASE>_{CONCURRENCIA,COLA,ESPERA,TASA,RAFAGA}
+    """
+    def __init__(self):
+        self.habilitado = os.environ.get('ADMISION_HABILITADA', 'true').lower() not in ('0', 'false', 'no')
+        # IPs o redes (CIDR) de los proxies cuyos X-Real-IP / X-Forwarded-For se aceptan
+        self.proxies_confiables = []
+        for valor in os.environ.get('ADMISION_PROXIES_CONFIABLES', '').split(','):
+            if valor.strip():
+                try:
+                    self.proxies_confiables.append(ipaddress.ip_network(valor.strip(), strict=False))
+                except ValueError:
+                    print(f"Proxy confiable inválido en ADMISION_PROXIES_CONFIABLES: {valor}")
+        # Offset de paginación a partir del cual una página se considera pesada
+        self.offset_profundo = _env('ADMISION_OFFSET_PROFUNDO', 1000, int)
+        self.clases = {}
+        for nombre, (concurrencia, cola, espera, tasa, rafaga) in CLASES_POR_DEFECTO.items():
+            prefijo = f"ADMISION_{nombre.upper()}_"
+            self.clases[nombre] = ClaseCosto(
+                nombre,
+                concurrencia=max(1, _env(prefijo + 'CONCURRENCIA', concurrencia, int)),
+                cola=max(0, _env(prefijo + 'COLA', cola, int)),
+                espera=max(0.0, _env(prefijo + 'ESPERA', espera, float)),
+                tasa=_env(prefijo + 'TASA', tasa, float),
+                rafaga=max(1, _env(prefijo + 'RAFAGA', rafaga, int))
+            )
+
+    def es_proxy_confiable(self, direccion):
+        try:
+            ip = ipaddress.ip_address(direccion)
+        except (TypeError, ValueError):
+            return False
+        return any(ip in red for red in self.proxies_confiables)
+
+    def identificar_cliente(self):
+        """
+        Identifica al cliente por la dirección remota. Solo si la petición llega
+        desde un proxy confiable (nginx) se usa la IP que este informa.
+        """
+        remota = request.remote_addr
+        if self.es_proxy_confiable(remota):
+            ip = request.headers.get('X-Real-IP')
+            if not ip and request.headers.get('X-Forwarded-For'):
+                # nginx agrega la IP del cliente al final de la lista
+                ip = request.headers['X-Forwarded-For'].split(',')[-1].strip()
+            if ip:
+                return ip
+        return remota or 'desconocido'
+
+    def ejecutar(self, clase, vista, args, kwargs):
+        """
+        Ejecuta la vista aplicando la clase de costo indicada o responde 429/503
+        """
+        if not self.habilitado:
+            return vista(*args, **kwargs)
+        costo = self.clases[clase() if callable(clase) else clase]
+
+        espera = costo.consumir_tasa(self.identificar_cliente())
+        if espera > 0:
+            return self._rechazo(429, "Demasiadas peticiones, reintente más tarde", espera)
+
+        if not costo.adquirir():
+            return self._rechazo(503, "Servidor ocupado, reintente más tarde", max(1, costo.espera))
+        try:
+            return vista(*args, **kwargs)
+        finally:
+            costo.liberar()
+
+    @staticmethod
+    def _rechazo(codigo, mensaje, reintentar_en):
+        segundos = max(1, math.ceil(reintentar_en))
+        respuesta = jsonify({"error": mensaje, "reintentar_en": segundos})
+        respuesta.status_code = codigo
+        respuesta.headers['Retry-After'] = str(segundos)
+        return respuesta
+
+    def estadisticas(self):
+        return {
+            'habilitado': self.habilitado,
+            'offset_profundo': self.offset_profundo,
+            'proxies_confiables': [str(red) for red in self.proxies_confiables],
+            'clases': {nombre: costo.estadisticas() for nombre, costo in self.clases.items()}
+        }
+
+def limitar(clase):
+    """
+    Decorador que aplica una clase de costo a una vista usando el ControlAdmision
+    de la aplicación (app.extensions['admision']). 'clase' puede ser el nombre de
+    la clase o una función sin argumentos que la determina por petición.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            return current_app.extensions['admision'].ejecutar(clase, vista, args, kwargs)
+        return envoltura
+    return decorador
@@ -1,20 +1,38 @@
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, current_app, jsonify, render_template, request
 import os
-from dotenv import load_dotenv
-from influxdb import InfluxDBClient
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 import subprocess
 import math
-import platform
-import psutil
-from sistema_info import get_info
+from esquema import campo_conteo, columnas
+from cache_consultas import CacheConsultas, ClienteConCache
+from admision import ControlAdmision, limitar
 
-load_dotenv()
-app = Flask(__name__)
+# Las dependencias pesadas (influxdb, psutil, platform, dotenv) se importan
+# recién cuando se usan para acelerar el arranque del contenedor.
 
+# Rutas de la aplicación: (url, vista, tipo de respuesta). create_app() las
+# registra y arma el catálogo de endpoints una única vez al iniciar.
+RUTAS = []
+
+def ruta(url, respuesta):
+    """
+    Decorador que declara una vista y su tipo de respuesta ('HTML', 'JSON' o 'TEXT')
+    """
+    def decorador(vista):
+        RUTAS.append((url, vista, respuesta))
+        return vista
+    return decorador
+
+# Límites de registros por página de cada vista paginada
+MAX_POR_PAGINA_TABLA = 20
+MAX_POR_PAGINA_API = 100
+MAX_POR_PAGINA_SISTEMA_INFO = 100
+
+@lru_cache(maxsize=None)
 def get_last_commit_info():
     """
-    Obtiene información del último commit de Git
+    Obtiene información del último commit de Git (una vez por proceso)
     """
     try:
         # Obtener hash corto y fecha del último commit
@@ -118,6 +136,7 @@ def convert_utc_to_local(utc_dt_str):
     return f"{utc_dt_str} (error de conversión)"
 
 def get_influxdb_client():
+    from influxdb import InfluxDBClient
     host = os.environ.get('INFLUXDB_HOST', 'localhost')
     port = int(os.environ.get('INFLUXDB_PORT', 8086))
     username = os.environ.get('INFLUXDB_USER')
@@ -128,9 +147,30 @@ def get_influxdb_client():
     else:
         client = InfluxDBClient(host=host, port=port)
     client.switch_database(database)
-    return client
+    return ClienteConCache(client, current_app.extensions['cache_consultas'])
+
+def leer_paginacion(max_por_pagina, por_defecto=10):
+    """
+    Lee y valida los parámetros 'pagina' y 'por_pagina' de la URL
+    """
+    pagina = request.args.get('pagina', 1, type=int)
+    por_pagina = request.args.get('por_pagina', por_defecto, type=int)
+    if pagina < 1:
+        pagina = 1
+    if por_pagina < 1 or por_pagina > max_por_pagina:
+        por_pagina = por_defecto
+    return pagina, por_pagina
+
+def costo_paginado(max_por_pagina):
+    """
+    Retorna una función que clasifica la petición paginada como 'media' o,
+    si el offset solicitado es profundo, como 'pesada'
+    """
+    def clasificar():
+        pagina, por_pagina = leer_paginacion(max_por_pagina)
+        return 'pesada' if (pagina - 1) * por_pagina >= current_app.extensions['admision'].offset_profundo else 'media'
+    return clasificar
 
-@app.context_processor
 def inject_commit_info():
     """
     Inyecta información del último commit en todos los templates
@@ -142,8 +182,9 @@ def contar_registros_influxdb(client, measurement='temperatura'):
     Función helper para contar registros en InfluxDB de manera eficiente
     """
     try:
-        # Método 1: Intentar con COUNT(*)
-        count_query = f'SELECT COUNT(*) FROM {measurement}'
+        # Método 1: Intentar con COUNT() sobre el campo de conteo del esquema
+        campo = campo_conteo(measurement)
+        count_query = f'SELECT COUNT("{campo}") FROM {measurement}'
         result = client.query(count_query)
         points = list(result.get_points())
         
@@ -156,14 +197,14 @@ def contar_registros_influxdb(client, measurement='temperatura'):
                     return int(value)
         
         # Método 2: Fallback - obtener una muestra y estimar
-        sample_query = f'SELECT * FROM {measurement} ORDER BY time DESC LIMIT 1000'
+        sample_query = f'SELECT "{campo}" FROM {measurement} ORDER BY time DESC LIMIT 1000'
         sample_result = client.query(sample_query)
         sample_count = len(list(sample_result.get_points()))
         
         if sample_count == 1000:
             # Si tenemos 1000 registros, probablemente hay más
             # Hacer un conteo menos eficiente pero más preciso
-            all_query = f'SELECT time FROM {measurement}'
+            all_query = f'SELECT "{campo}" FROM {measurement}'
             all_result = client.query(all_query)
             return len(list(all_result.get_points()))
         else:
@@ -174,30 +215,25 @@ def contar_registros_influxdb(client, measurement='temperatura'):
         return 0
 
 ### ----------------------------------------------- ###
-@app.route('/tabla')
+@ruta('/tabla', respuesta='HTML')
+@limitar('pesada')
 def tabla():
     """
     Renderiza una tabla HTML con los datos de temperatura desde InfluxDB
     """
     client = get_influxdb_client()
-    resultados = client.query('SELECT * FROM temperatura ORDER BY time DESC')
+    resultados = client.query(f'SELECT {columnas("temperatura", campos=["valor"])} FROM temperatura ORDER BY time DESC')
     puntos = list(resultados.get_points())
     return render_template('tabla.html', datos=puntos)
 
-@app.route('/tabla-paginada')
+@ruta('/tabla-paginada', respuesta='HTML')
+@limitar(costo_paginado(MAX_POR_PAGINA_TABLA))
 def tabla_paginada():
     """
     Renderiza una tabla HTML con paginación de los datos de temperatura desde InfluxDB
     """
     # Parámetros de paginación desde la URL
-    pagina = request.args.get('pagina', 1, type=int)
-    por_pagina = request.args.get('por_pagina', 10, type=int)
-    
-    # Validar parámetros
-    if pagina < 1:
-        pagina = 1
-    if por_pagina < 1 or por_pagina > 20:  # Límite máximo de 100 registros por página
-        por_pagina = 10
+    pagina, por_pagina = leer_paginacion(MAX_POR_PAGINA_TABLA)
     
     # Conectar a InfluxDB
     client = get_influxdb_client()
@@ -209,7 +245,7 @@ def tabla_paginada():
     offset = (pagina - 1) * por_pagina
     
     # Consulta con LIMIT y OFFSET para paginación
-    query_paginada = f'SELECT * FROM temperatura ORDER BY time DESC LIMIT {por_pagina} OFFSET {offset}'
+    query_paginada = f'SELECT {columnas("temperatura", campos=["valor"])} FROM temperatura ORDER BY time DESC LIMIT {por_pagina} OFFSET {offset}'
     resultados = client.query(query_paginada)
     puntos = list(resultados.get_points())
     
@@ -237,68 +273,24 @@ def tabla_paginada():
     
     return render_template('tabla_paginada.html', datos=puntos, paginacion=paginacion)
 
-@app.route('/endpoints-page')
+@ruta('/endpoints-page', respuesta='HTML')
+@limitar('ligera')
 def endpoints_page():
     """
     Página HTML que muestra todos los endpoints disponibles en la aplicación de forma visual
     """
-    endpoints = []
-    
-    for rule in app.url_map.iter_rules():
-        # Obtener información del endpoint
-        endpoint_info = {
-            'endpoint': rule.endpoint,
-            'methods': list(rule.methods - {'HEAD', 'OPTIONS'}),
-            'url': rule.rule,
-            'description': app.view_functions[rule.endpoint].__doc__ or 'Sin descripción disponible'
-        }
-        
-        # Agregar categoría basada en la URL
-        if '/api/' in rule.rule:
-            endpoint_info['category'] = 'API'
-            endpoint_info['icon'] = '🔗'
-        elif '/tabla' in rule.rule:
-            endpoint_info['category'] = 'Visualización'
-            endpoint_info['icon'] = '📊'
-        elif rule.rule in ['/', '/sistema']:
-            endpoint_info['category'] = 'Principal'
-            endpoint_info['icon'] = '🏠'
-        elif '/endpoints' in rule.rule:
-            endpoint_info['category'] = 'Documentación'
-            endpoint_info['icon'] = '📋'
-        else:
-            endpoint_info['category'] = 'Otros'
-            endpoint_info['icon'] = '⚙️'
-        
-        # Determinar el tipo de respuesta
-        if 'json' in endpoint_info['description'].lower() or '/api/' in rule.rule or rule.rule == '/datos':
-            endpoint_info['response_type'] = 'JSON'
-        elif 'html' in endpoint_info['description'].lower() or 'renderiza' in endpoint_info['description'].lower():
-            endpoint_info['response_type'] = 'HTML'
-        else:
-            endpoint_info['response_type'] = 'TEXT'
-        
-        endpoints.append(endpoint_info)
-    
-    # Agrupar endpoints por categoría
-    categorias = {}
-    for endpoint in endpoints:
-        cat = endpoint['category']
-        if cat not in categorias:
-            categorias[cat] = []
-        categorias[cat].append(endpoint)
-    
-    return render_template('endpoints_page.html', categorias=categorias, total_endpoints=len(endpoints))
+    catalogo = current_app.extensions['catalogo']
+    return render_template('endpoints_page.html', categorias=catalogo['categorias'], total_endpoints=len(catalogo['endpoints']))
 
-@app.route('/tabla-sistema-info')
+@ruta('/tabla-sistema-info', respuesta='HTML')
+@limitar(costo_paginado(MAX_POR_PAGINA_SISTEMA_INFO))
 def tabla_sistema_info():
     """
     Renderiza una tabla HTML con paginación y filtros de los datos de sistema_info desde InfluxDB
     """
     client = get_influxdb_client()
     # Parámetros de paginación y filtro
-    pagina = int(request.args.get('pagina', 1))
-    por_pagina = int(request.args.get('por_pagina', 10))
+    pagina, por_pagina = leer_paginacion(MAX_POR_PAGINA_SISTEMA_INFO)
     host = request.args.get('host')
     sistema = request.args.get('sistema')
 
@@ -309,7 +301,7 @@ def tabla_sistema_info():
     if sistema:
         where.append(f"sistema='{sistema}'")
     where_clause = f"WHERE {' AND '.join(where)}" if where else ""
-    query = f"SELECT * FROM sistema_info {where_clause} ORDER BY time DESC LIMIT {por_pagina} OFFSET {(pagina-1)*por_pagina}"
+    query = f"SELECT {columnas('sistema_info')} FROM sistema_info {where_clause} ORDER BY time DESC LIMIT {por_pagina} OFFSET {(pagina-1)*por_pagina}"
     resultados = client.query(query)
     puntos = list(resultados.get_points())
 
@@ -321,13 +313,15 @@ def tabla_sistema_info():
     # Obtener hosts y sistemas únicos para los filtros
     hosts = set()
     sistemas = set()
-    all_results = client.query("SELECT host, sistema FROM sistema_info")
-    for p in all_results.get_points():
-        hosts.add(p.get('host'))
-        sistemas.add(p.get('sistema'))
+    tag_results = client.query('SHOW TAG VALUES FROM sistema_info WITH KEY IN ("host", "sistema")')
+    for p in tag_results.get_points():
+        if p.get('key') == 'host':
+            hosts.add(p.get('value'))
+        elif p.get('key') == 'sistema':
+            sistemas.add(p.get('value'))
 
     # Para paginación: contar total de registros
-    count_query = f"SELECT COUNT(*) FROM sistema_info {where_clause}"
+    count_query = f"SELECT COUNT(\"{campo_conteo('sistema_info')}\") FROM sistema_info {where_clause}"
     count_result = client.query(count_query)
     total = 0
     for point in list(count_result.get_points()):
@@ -351,7 +345,8 @@ def tabla_sistema_info():
         sistema_seleccionado=sistema
     )
 
-@app.route('/servicios-activos-tabla')
+@ruta('/servicios-activos-tabla', respuesta='HTML')
+@limitar('media')
 def servicios_activos_tabla():
     """
     Muestra la lista de servicios activos en una tabla HTML usando systemctl
@@ -377,29 +372,33 @@ def servicios_activos_tabla():
     except Exception as e:
         return render_template('servicios_activos.html', servicios=[], error=str(e))
 
-@app.route('/indice')
+@ruta('/indice', respuesta='HTML')
+@limitar('ligera')
 def indice():
     """
     Página índice con acceso a todos los endpoints disponibles
     """
-    endpoints = []
-    for rule in app.url_map.iter_rules():
-        # Excluir endpoints internos de Flask
-        if rule.endpoint != 'static':
-            endpoints.append({
-                'url': rule.rule,
-                'methods': ', '.join(rule.methods - {'HEAD', 'OPTIONS'}),
-                'description': app.view_functions[rule.endpoint].__doc__ or 'Sin descripción'
-            })
-    return render_template('indice.html', endpoints=endpoints)
+    return render_template('indice.html', endpoints=current_app.extensions['catalogo']['indice'])
 
-@app.route('/grafica')
+@ruta('/grafica', respuesta='HTML')
+@limitar('media')
 def grafica():
     """
     Renderiza una página HTML con una gráfica de los datos de temperatura desde InfluxDB
     """
     client = get_influxdb_client()
-    resultados = client.query('SELECT * FROM temperatura ORDER BY time DESC LIMIT 100')
+    # Graficar un único sensor: el indicado en la URL o el del último punto
+    sensor = request.args.get('sensor')
+    if not sensor:
+        ultimo = list(client.query('SELECT "valor", "sensor" FROM temperatura ORDER BY time DESC LIMIT 1').get_points())
+        sensor = ultimo[0].get('sensor') if ultimo else None
+    if sensor:
+        resultados = client.query(
+            f'SELECT {columnas("temperatura", incluir_tags=False, campos=["valor"])} FROM temperatura WHERE "sensor" = $sensor ORDER BY time DESC LIMIT 100',
+            bind_params={'sensor': sensor}
+        )
+    else:
+        resultados = client.query(f'SELECT {columnas("temperatura", incluir_tags=False, campos=["valor"])} FROM temperatura ORDER BY time DESC LIMIT 100')
     puntos = list(resultados.get_points())
     
     # Invertir para mostrar la gráfica en orden cronológico
@@ -409,31 +408,23 @@ def grafica():
     valores = [p.get('valor', None) for p in puntos]
     return render_template('grafica.html', tiempos=tiempos, valores=valores)
 
-@app.route('/json-endpoints')
+@ruta('/json-endpoints', respuesta='HTML')
+@limitar('ligera')
 def json_endpoints():
     """
     Página HTML que muestra todos los endpoints que retornan JSON y permite ver su salida en vivo
     """
-    # Filtrar endpoints que retornan JSON
-    endpoints = []
-    for rule in app.url_map.iter_rules():
-        if rule.endpoint != 'static':
-            doc = app.view_functions[rule.endpoint].__doc__ or ''
-            # Heurística: si la descripción menciona JSON o el endpoint es /api/ o /datos
-            if 'json' in doc.lower() or '/api/' in rule.rule or rule.rule in ['/datos', '/sistema', '/sistema-info', '/status', '/endpoints']:
-                endpoints.append({
-                    'url': rule.rule,
-                    'description': doc.strip() or 'Sin descripción'
-                })
-    return render_template('json_endpoints.html', endpoints=endpoints)
+    return render_template('json_endpoints.html', endpoints=current_app.extensions['catalogo']['json'])
 
 ### ----------------------------------------------- ###
-# jsonify
-@app.route('/status')
+@ruta('/status', respuesta='JSON')
+@limitar('ligera')
 def status():
     """
     Endpoint principal que muestra la fecha/hora actual y la temperatura del sistema
     """
+    import platform
+    import psutil
     fh = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
         # Intentar obtener temperatura usando psutil
@@ -461,54 +452,52 @@ def status():
         "temperatura": temp,
         "mensaje": "🐳 Flask en Docker"
     })
-# jsonify
-@app.route('/datos')
+
+@ruta('/datos', respuesta='JSON')
+@limitar('pesada')
 def mostrar_datos():
     """
     Retorna los últimos datos de temperatura almacenados en InfluxDB en formato JSON
     """
     client = get_influxdb_client()
     # Consulta: últimos 10 puntos de "temperatura"
-    resultados = client.query('SELECT * FROM temperatura ORDER BY time DESC')
+    resultados = client.query(f'SELECT {columnas("temperatura")} FROM temperatura ORDER BY time DESC')
     puntos = list(resultados.get_points())
     return jsonify(puntos)  # Devuelve JSON
-# jsonify
-@app.route('/sistema')
+
+@ruta('/sistema', respuesta='JSON')
+@limitar('ligera')
 def sistema():
     """
     Retorna información del sistema en formato JSON
     """
+    from sistema_info import get_info
     info = get_info()
     return jsonify(info)
-# jsonify
-@app.route('/sistema-info')
+
+@ruta('/sistema-info', respuesta='JSON')
+@limitar('media')
 def sistema_info():
     """
     Consulta los últimos datos insertados en la medición sistema_info de InfluxDB.
     """
     client = get_influxdb_client()
-    query = 'SELECT * FROM sistema_info ORDER BY time DESC LIMIT 1'
+    query = f'SELECT {columnas("sistema_info")} FROM sistema_info ORDER BY time DESC LIMIT 1'
     result = client.query(query)
     points = list(result.get_points())
     if points:
         return jsonify(points[0])
     else:
         return jsonify({"error": "No hay datos en sistema_info"}), 404
-# jsonify
-@app.route('/api/datos-paginados')
+
+@ruta('/api/datos-paginados', respuesta='JSON')
+@limitar(costo_paginado(MAX_POR_PAGINA_API))
 def api_datos_paginados():
     """
     API que retorna datos de temperatura paginados en formato JSON
     """
     # Parámetros de paginación desde la URL
-    pagina = request.args.get('pagina', 1, type=int)
-    por_pagina = request.args.get('por_pagina', 10, type=int)
-    
-    # Validar parámetros
-    if pagina < 1:
-        pagina = 1
-    if por_pagina < 1 or por_pagina > 100:
-        por_pagina = 10
+    pagina, por_pagina = leer_paginacion(MAX_POR_PAGINA_API)
     
     # Conectar a InfluxDB
     client = get_influxdb_client()
@@ -520,7 +509,7 @@ def api_datos_paginados():
     offset = (pagina - 1) * por_pagina
     
     # Consulta con LIMIT y OFFSET para paginación
-    query_paginada = f'SELECT * FROM temperatura ORDER BY time DESC LIMIT {por_pagina} OFFSET {offset}'
+    query_paginada = f'SELECT {columnas("temperatura")} FROM temperatura ORDER BY time DESC LIMIT {por_pagina} OFFSET {offset}'
     resultados = client.query(query_paginada)
     puntos = list(resultados.get_points())
     
@@ -545,30 +534,109 @@ def api_datos_paginados():
             'ultima': f'/api/datos-paginados?pagina={total_paginas}&por_pagina={por_pagina}'
         }
     })
-# jsonify
-@app.route('/endpoints')
+
+@ruta('/endpoints', respuesta='JSON')
+@limitar('ligera')
 def listar_endpoints():
     """
     Endpoint que retorna información sobre todos los endpoints disponibles en la aplicación
     """
-    endpoints = []
-    
-    for rule in app.url_map.iter_rules():
-        endpoint_info = {
-            'endpoint': rule.endpoint,
-            'methods': list(rule.methods - {'HEAD', 'OPTIONS'}),  # Excluir métodos HEAD y OPTIONS por defecto
-            'url': rule.rule,
-            'description': app.view_functions[rule.endpoint].__doc__ or 'Sin descripción disponible'
-        }
-        endpoints.append(endpoint_info)
-    
+    endpoints = current_app.extensions['catalogo']['listado']
     return jsonify({
         'total_endpoints': len(endpoints),
         'endpoints': endpoints
     })
 
+@ruta('/cache-stats', respuesta='JSON')
+@limitar('ligera')
+def cache_stats():
+    """
+    Retorna las estadísticas de la cache de consultas (aciertos, fallos, ratio) en formato JSON
+    """
+    return jsonify(current_app.extensions['cache_consultas'].estadisticas())
+
+@ruta('/admision-stats', respuesta='JSON')
+def admision_stats():
+    """
+    Retorna los límites y contadores del control de admisión por clase de costo en formato JSON
+    """
+    return jsonify(current_app.extensions['admision'].estadisticas())
+
 ### ----------------------------------------------- ###
+def categoria_endpoint(url):
+    """
+    Retorna la categoría y el ícono de un endpoint según su URL
+    """
+    if '/api/' in url:
+        return 'API', '🔗'
+    elif '/tabla' in url:
+        return 'Visualización', '📊'
+    elif url in ['/', '/sistema']:
+        return 'Principal', '🏠'
+    elif '/endpoints' in url:
+        return 'Documentación', '📋'
+    return 'Otros', '⚙️'
+
+def construir_catalogo(app):
+    """
+    Arma el catálogo de endpoints que usan /endpoints, /endpoints-page, /indice y /json-endpoints
+    """
+    tipos = {vista.__name__: respuesta for _, vista, respuesta in RUTAS}
+    catalogo = {'endpoints': [], 'categorias': {}, 'indice': [], 'json': [], 'listado': []}
+
+    for rule in app.url_map.iter_rules():
+        doc = app.view_functions[rule.endpoint].__doc__
+        metodos = sorted(rule.methods - {'HEAD', 'OPTIONS'})
+        categoria, icono = categoria_endpoint(rule.rule)
+        endpoint_info = {
+            'endpoint': rule.endpoint,
+            'methods': metodos,
+            'url': rule.rule,
+            'description': doc or 'Sin descripción disponible',
+            'category': categoria,
+            'icon': icono,
+            'response_type': tipos.get(rule.endpoint, 'TEXT')
+        }
+        catalogo['endpoints'].append(endpoint_info)
+        catalogo['categorias'].setdefault(categoria, []).append(endpoint_info)
+        catalogo['listado'].append({k: endpoint_info[k] for k in ('endpoint', 'methods', 'url', 'description')})
+
+        # Excluir endpoints internos de Flask
+        if rule.endpoint == 'static':
+            continue
+        catalogo['indice'].append({
+            'url': rule.rule,
+            'methods': ', '.join(metodos),
+            'description': doc or 'Sin descripción'
+        })
+        if endpoint_info['response_type'] == 'JSON':
+            catalogo['json'].append({
+                'url': rule.rule,
+                'description': (doc or '').strip() or 'Sin descripción'
+            })
+    return catalogo
+
+def create_app():
+    """
+    Crea la aplicación Flask, registra las rutas y precalcula el catálogo de endpoints
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    app = Flask(__name__)
+
+    # Cache de resultados compartida por todas las consultas del proceso
+    app.extensions['cache_consultas'] = CacheConsultas()
+    # Control de admisión por clase de costo (ligera/media/pesada) de los endpoints
+    app.extensions['admision'] = ControlAdmision()
+
+    app.context_processor(inject_commit_info)
+    for url, vista, _ in RUTAS:
+        app.add_url_rule(url, view_func=vista)
+    app.extensions['catalogo'] = construir_catalogo(app)
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     host = os.environ.get('FLASK_HOST', '0.0.0.0')
     port = int(os.environ.get('FLASK_PORT', 5000))
     app.run(host=host, port=port)
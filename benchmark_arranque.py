@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Código que se ejecuta en un intérprete nuevo para medir un arranque en frío
+MEDICION_ARRANQUE = """
+import json, resource, sys, time
+inicio = time.perf_counter()
+import app
+aplicacion = app.create_app()
+arranque = time.perf_counter() - inicio
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+cliente = aplicacion.test_client()
+catalogo = {}
+estados = {}
+for url in %(urls)r:
+    tiempos = []
+    for _ in range(%(peticiones)d):
+        t = time.perf_counter()
+        respuesta = cliente.get(url)
+        tiempos.append(time.perf_counter() - t)
+        estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+    catalogo[url] = tiempos
+
+print(json.dumps({
+    'arranque': arranque,
+    'rss_kb': rss_kb,
+    'cargados': [m for m in ('influxdb', 'psutil', 'sqlite3') if m in sys.modules],
+    'catalogo': catalogo,
+    'estados': estados
+}))
+"""
+
+# Costo de importar las dependencias pesadas que ahora se cargan bajo demanda
+MEDICION_DEPENDENCIAS = """
+import json, resource, time
+inicio = time.perf_counter()
+import influxdb, psutil
+print(json.dumps({'importacion': time.perf_counter() - inicio,
+                  'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+URLS_CATALOGO = ['/endpoints', '/endpoints-page', '/indice', '/json-endpoints']
+
+def ejecutar(codigo):
+    # Sin control de admisión: las peticiones seguidas del catálogo superan la
+    # ráfaga de la clase 'ligera' y se mediría el armado de respuestas 429
+    env = dict(os.environ, ADMISION_HABILITADA='false')
+    resultado = subprocess.run(
+        [sys.executable, '-c', codigo],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True, cwd=DIRECTORIO, env=env
+    )
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+def ms(segundos):
+    return f"{segundos * 1000:.1f} ms"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el arranque en frío de la aplicación y el costo de las páginas de catálogo")
+    parser.add_argument('-n', '--repeticiones', type=int, default=5, help="Arranques en frío a medir")
+    parser.add_argument('-p', '--peticiones', type=int, default=20, help="Peticiones por página de catálogo")
+    args = parser.parse_args(argv)
+
+    codigo = MEDICION_ARRANQUE % {'urls': URLS_CATALOGO, 'peticiones': args.peticiones}
+    muestras = [ejecutar(codigo) for _ in range(args.repeticiones)]
+    dependencias = [ejecutar(MEDICION_DEPENDENCIAS) for _ in range(args.repeticiones)]
+
+    print(f"Arranque en frío ({args.repeticiones} repeticiones, mediana)")
+    print(f"  import app + create_app(): {ms(statistics.median(m['arranque'] for m in muestras))}")
+    print(f"  RSS máximo:                {statistics.median(m['rss_kb'] for m in muestras) / 1024:.1f} MB")
+    print(f"  Dependencias pesadas:      {', '.join(muestras[0]['cargados']) or 'ninguna'}")
+    print(f"  Diferido (influxdb+psutil): {ms(statistics.median(d['importacion'] for d in dependencias))}, "
+          f"RSS {statistics.median(d['rss_kb'] for d in dependencias) / 1024:.1f} MB en un intérprete vacío")
+    estados = ', '.join(f"{codigo}: {n}" for codigo, n in sorted(muestras[0]['estados'].items()))
+    print(f"Páginas de catálogo ({args.peticiones} peticiones, primera / mediana del resto; respuestas {estados})")
+    for url in URLS_CATALOGO:
+        tiempos = muestras[0]['catalogo'][url]
+        resto = tiempos[1:] or tiempos
+        print(f"  {url:<16} {ms(tiempos[0])} / {ms(statistics.median(resto))}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from esquema import ESQUEMAS, campo_conteo
+
+_PATRON_MEDICION = re.compile(r'\bFROM\s+"?(\w+)"?', re.IGNORECASE)
+
+def normalizar_consulta(query):
+    """
+    Normaliza una sentencia InfluxQL colapsando espacios para usarla como clave
+    """
+    return ' '.join(query.split())
+
+def celdas(raw):
+    """
+    Cuenta los valores de un resultado crudo de InfluxDB sin serializarlo
+    """
+    return sum(len(serie.get('columns', [])) * len(serie.get('values', []))
+               for serie in raw.get('series', []))
+
+def mediciones_de(query):
+    """
+    Retorna las mediciones referenciadas por una consulta (cláusulas FROM)
+    """
+    return sorted(set(_PATRON_MEDICION.findall(query)))
+
+def notificar_escritura(measurement):
+    """
+    Marca que un colector escribió en 'measurement' para invalidar la cache sin sondear InfluxDB.
+    No hace nada si CACHE_DIR_NOTIFICACIONES no está configurado.
+    """
+    directorio = os.environ.get('CACHE_DIR_NOTIFICACIONES')
+    if not directorio:
+        return
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f"{measurement}.escritura")
+        with open(ruta, 'a'):
+            os.utime(ruta, None)
+    except OSError as e:
+        print(f"Error notificando escritura de {measurement}: {e}")
+
+class BackendSQLite:
+    """
+    Almacén compartido de resultados entre procesos usando un archivo SQLite local.
+    Los errores de SQLite (p. ej. "database is locked") se cuentan en 'errores' y
+    la operación se trata como un fallo de cache: nunca hacen fallar la consulta.
+    """
+    def __init__(self, ruta):
+        # sqlite3 solo se carga si se configuró el backend compartido
+        import sqlite3
+        self._sqlite3 = sqlite3
+        self.ruta = ruta
+        self.errores = 0
+        self._local = threading.local()
+        self._conexion().execute(
+            'CREATE TABLE IF NOT EXISTS resultados '
+            '(clave TEXT PRIMARY KEY, version TEXT, raw TEXT, tamano INTEGER, creado REAL)'
+        )
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = self._sqlite3.connect(self.ruta, timeout=1, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def obtener(self, clave, version):
+        try:
+            fila = self._conexion().execute(
+                'SELECT raw FROM resultados WHERE clave = ? AND version = ?', (clave, version)
+            ).fetchone()
+        except self._sqlite3.Error as e:
+            self._error('leyendo', e)
+            return None
+        return fila[0] if fila else None
+
+    def guardar(self, clave, version, serializado, max_entradas, max_bytes):
+        try:
+            conexion = self._conexion()
+            conexion.execute(
+                'INSERT OR REPLACE INTO resultados (clave, version, raw, tamano, creado) VALUES (?, ?, ?, ?, ?)',
+                (clave, version, serializado, len(serializado), time.time())
+            )
+            # Conservar las entradas más recientes dentro de ambos límites
+            conexion.execute(
+                'DELETE FROM resultados WHERE clave IN (SELECT clave FROM '
+                '(SELECT clave, ROW_NUMBER() OVER (ORDER BY creado DESC) AS orden, '
+                'SUM(tamano) OVER (ORDER BY creado DESC) AS acumulado FROM resultados) '
+                'WHERE orden > ? OR acumulado > ?)', (max_entradas, max_bytes)
+            )
+        except self._sqlite3.Error as e:
+            self._error('guardando', e)
+
+    def _error(self, operacion, e):
+        self.errores += 1
+        print(f"Error de la cache compartida {operacion} en {self.ruta}: {e}")
+
+class CacheConsultas:
+    """
+    Cache LRU de resultados de consultas InfluxDB invalidada por la última escritura de cada medición.
+    Los parámetros no indicados se leen de las variables de entorno CACHE_*.
+    """
+    def __init__(self, habilitada=None, max_entradas=None, max_bytes=None, max_bytes_entrada=None,
+                 intervalo_sondeo=None, ruta_sqlite=None, dir_notificaciones=None):
+        if habilitada is None:
+            habilitada = os.environ.get('CACHE_HABILITADA', 'true').lower() not in ('0', 'false', 'no')
+        self.habilitada = habilitada
+        self.max_entradas = max_entradas or int(os.environ.get('CACHE_MAX_ENTRADAS', 256))
+        # Límite aproximado de memoria (tamaño del resultado serializado en JSON)
+        self.max_bytes = max_bytes or int(os.environ.get('CACHE_MAX_BYTES', 8 * 1024 * 1024))
+        # Resultados más grandes que esto (p. ej. /tabla o /datos completos) no se guardan
+        self.max_bytes_entrada = max_bytes_entrada or int(os.environ.get('CACHE_MAX_BYTES_ENTRADA', 512 * 1024))
+        # Segundos durante los que se reutiliza la última sonda de "última escritura"
+        self.intervalo_sondeo = intervalo_sondeo if intervalo_sondeo is not None else float(os.environ.get('CACHE_INTERVALO_SONDEO', 5))
+        # Directorio donde los colectores marcan sus escrituras (ver notificar_escritura)
+        self.dir_notificaciones = dir_notificaciones or os.environ.get('CACHE_DIR_NOTIFICACIONES')
+        # Backend compartido opcional entre workers (archivo SQLite local)
+        ruta_sqlite = ruta_sqlite or os.environ.get('CACHE_SQLITE_PATH')
+        self.compartido = None
+        if ruta_sqlite:
+            import sqlite3
+            try:
+                self.compartido = BackendSQLite(ruta_sqlite)
+            except sqlite3.Error as e:
+                print(f"No se pudo abrir la cache compartida {ruta_sqlite}, se usa solo memoria: {e}")
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._sondeos = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_compartidos = 0
+        self.fallos = 0
+        self.no_guardadas = 0
+        self.sondeos = 0
+
+    def _ultima_escritura(self, client, measurement):
+        """
+        Retorna un marcador de la última escritura de la medición: una sonda LAST()
+        memorizada unos segundos más, si existe, el mtime de la notificación del
+        colector. La notificación invalida al instante; la sonda detecta a los
+        escritores que no notifican.
+
+        La sonda solo ve el timestamp del punto más nuevo, no el momento de la
+        escritura: puntos escritos tarde con timestamps anteriores (el reenvío de
+        'pendientes' de temp_daemon tras una caída) o reescrituras en el lugar
+        (migrar_esquema.py) no la cambian. Esos escritores llaman a
+        notificar_escritura(); sin CACHE_DIR_NOTIFICACIONES sus cambios se ven
+        recién cuando llega un punto más nuevo.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            sondeo = self._sondeos.get(measurement)
+        if sondeo and ahora - sondeo[0] < self.intervalo_sondeo:
+            marcador = sondeo[1]
+        else:
+            campo = campo_conteo(measurement)
+            puntos = list(client.query(f'SELECT LAST("{campo}") FROM "{measurement}"', epoch='ns').get_points())
+            marcador = f"s{puntos[0]['time']}" if puntos else 's0'
+            with self._lock:
+                self._sondeos[measurement] = (ahora, marcador)
+                self.sondeos += 1
+
+        if self.dir_notificaciones:
+            try:
+                marcador += f"n{os.stat(os.path.join(self.dir_notificaciones, f'{measurement}.escritura')).st_mtime_ns}"
+            except OSError:
+                pass
+        return marcador
+
+    def consultar(self, client, query, **kwargs):
+        """
+        Ejecuta client.query() pasando por la cache. Las consultas sobre mediciones
+        sin esquema conocido se ejecutan siempre contra InfluxDB.
+        """
+        mediciones = mediciones_de(query)
+        if not mediciones or any(m not in ESQUEMAS for m in mediciones):
+            return client.query(query, **kwargs)
+
+        clave = json.dumps([normalizar_consulta(query), kwargs], sort_keys=True, default=str)
+        version = '|'.join(self._ultima_escritura(client, m) for m in mediciones)
+
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[0] == version:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+
+        serializado = self.compartido.obtener(clave, version) if self.compartido else None
+        if serializado is not None:
+            from influxdb.resultset import ResultSet
+            resultado = ResultSet(json.loads(serializado))
+            tamano = len(serializado)
+            with self._lock:
+                self.aciertos_compartidos += 1
+        else:
+            resultado = client.query(query, **kwargs)
+            with self._lock:
+                self.fallos += 1
+            # Cada valor ocupa al menos 3 bytes en JSON ("1, "): los resultados que
+            # seguro exceden el límite (/tabla, /datos) no se llegan a serializar
+            if celdas(resultado.raw) * 3 > self.max_bytes_entrada:
+                serializado = None
+            else:
+                serializado = json.dumps(resultado.raw)
+            if serializado is None or len(serializado) > self.max_bytes_entrada:
+                with self._lock:
+                    self.no_guardadas += 1
+                return resultado
+            tamano = len(serializado)
+            if self.compartido:
+                self.compartido.guardar(clave, version, serializado, self.max_entradas, self.max_bytes)
+
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior:
+                self._bytes -= anterior[2]
+            self._entradas[clave] = (version, resultado, tamano)
+            self._bytes += tamano
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, _, liberado) = self._entradas.popitem(last=False)
+                self._bytes -= liberado
+        return resultado
+
+    def invalidar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+            self._sondeos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.aciertos_compartidos + self.fallos
+            return {
+                'habilitada': self.habilitada,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'max_bytes_entrada': self.max_bytes_entrada,
+                'aciertos': self.aciertos,
+                'aciertos_compartidos': self.aciertos_compartidos,
+                'fallos': self.fallos,
+                'no_guardadas': self.no_guardadas,
+                'sondeos': self.sondeos,
+                'ratio_aciertos': round((self.aciertos + self.aciertos_compartidos) / total, 4) if total else 0.0,
+                'backend_compartido': 'sqlite' if self.compartido else None,
+                'errores_compartido': self.compartido.errores if self.compartido else 0,
+                'notificaciones': bool(self.dir_notificaciones)
+            }
+
+class ClienteConCache:
+    """
+    Envoltorio de InfluxDBClient que resuelve query() a través de la cache
+    """
+    def __init__(self, client, cache):
+        self._client = client
+        self._cache = cache
+
+    def query(self, query, **kwargs):
+        if not self._cache.habilitada:
+            return self._client.query(query, **kwargs)
+        return self._cache.consultar(self._client, query, **kwargs)
+
+    def __getattr__(self, nombre):
+        return getattr(self._client, nombre)
@@ -0,0 +1,99 @@
+import time
+
+# Precisión con la que se escriben los puntos en InfluxDB ('s' = segundos)
+PRECISION_ESCRITURA = 's'
+
+# Definición versionada de las mediciones almacenadas en InfluxDB.
+# Al cambiar campos o tags de una medición hay que incrementar su versión
+# y, si corresponde, agregar los campos eliminados a 'obsoletos' para que
+# migrar_esquema.py sepa qué compactar.
+ESQUEMAS = {
+    'temperatura': {
+        'version': 3,
+        'tags': ['host', 'sensor'],
+        # v3: agregados por minuto del muestreo a 1 Hz; 'valor' es el promedio
+        'campos': {
+            'valor': float,
+            'valor_min': float,
+            'valor_max': float,
+            'valor_ultimo': float,
+            'muestras': int,
+        },
+        'campo_conteo': 'valor',
+        # v1 escribía el timestamp duplicado y un uuid aleatorio en cada punto
+        'obsoletos': ['inserted_at', 'uuid'],
+    },
+    'sistema_info': {
+        'version': 1,
+        'tags': ['host', 'sistema', 'arquitectura'],
+        'campos': {
+            'cpu_uso_porcentual': float,
+            'cpu_nucleos_logicos': int,
+            'cpu_nucleos_fisicos': int,
+            'ram_total': int,
+            'ram_disponible': int,
+            'ram_uso_porcentual': float,
+            'disco_total': int,
+            'disco_usado': int,
+            'disco_libre': int,
+            'disco_uso_porcentual': float,
+            'red_bytes_enviados': int,
+            'red_bytes_recibidos': int,
+        },
+        'campo_conteo': 'cpu_uso_porcentual',
+        'obsoletos': [],
+    },
+}
+
+def obtener_esquema(measurement):
+    """
+    Retorna la definición de esquema de una medición o lanza ValueError si no existe
+    """
+    try:
+        return ESQUEMAS[measurement]
+    except KeyError:
+        raise ValueError(f"Medición sin esquema definido: {measurement}")
+
+def columnas(measurement, incluir_tags=True, campos=None):
+    """
+    Retorna la lista de columnas explícitas para usar en un SELECT en lugar de '*'
+    """
+    esquema = obtener_esquema(measurement)
+    nombres = list(campos) if campos is not None else list(esquema['campos'])
+    if incluir_tags:
+        nombres += esquema['tags']
+    return ', '.join(f'"{nombre}"' for nombre in nombres)
+
+def campo_conteo(measurement):
+    """
+    Retorna el campo usado para contar registros de una medición con COUNT()
+    """
+    return obtener_esquema(measurement)['campo_conteo']
+
+def crear_punto(measurement, campos, tags=None, tiempo=None):
+    """
+    Construye un punto compatible con write_points() ajustado al esquema de la medición.
+    Descarta los campos que no pertenecen al esquema y convierte el tiempo a
+    segundos epoch (se debe escribir con time_precision=PRECISION_ESCRITURA).
+    """
+    esquema = obtener_esquema(measurement)
+    fields = {}
+    for nombre, tipo in esquema['campos'].items():
+        if campos.get(nombre) is not None:
+            fields[nombre] = tipo(campos[nombre])
+    if not fields:
+        raise ValueError(f"Punto de {measurement} sin campos válidos: {campos}")
+
+    if tiempo is None:
+        tiempo = time.time()
+    elif hasattr(tiempo, 'timestamp'):
+        tiempo = tiempo.timestamp()
+
+    punto = {
+        "measurement": measurement,
+        "time": int(tiempo),
+        "fields": fields
+    }
+    if tags:
+        punto["tags"] = {k: str(v) for k, v in tags.items() if k in esquema['tags'] and v is not None}
+    return punto
@@ -3,6 +3,8 @@ from influxdb import InfluxDBClient
 from dotenv import load_dotenv
 import time
 import random
+from esquema import PRECISION_ESCRITURA, crear_punto
+from cache_consultas import notificar_escritura
 
 def load_temps(n_iteraciones=10, delay=1):
     """
@@ -25,15 +27,14 @@ def load_temps(n_iteraciones=10, delay=1):
 
     for i in range(n_iteraciones):
         temp = round(random.uniform(20.0, 40.0), 2)
-        punto = [{
-            "measurement": "temperatura",
-            "fields": {"valor": temp}
-        }]
-        client.write_points(punto)
+        punto = [crear_punto("temperatura", {"valor": temp})]
+        client.write_points(punto, time_precision=PRECISION_ESCRITURA)
+        notificar_escritura("temperatura")
         print(f"Registro {i+1}: {temp}°C insertado.")
         time.sleep(delay)
 
 if __name__ == "__main__":
     import sys
     n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
-    load_temps(n, 0.5)
+    # Con precisión de segundos, dos puntos en el mismo segundo se pisan
+    load_temps(n, 1)
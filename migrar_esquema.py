@@ -0,0 +1,220 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from influxdb import InfluxDBClient
+from dotenv import load_dotenv
+from cache_consultas import notificar_escritura
+from esquema import ESQUEMAS, PRECISION_ESCRITURA, campo_conteo, columnas, obtener_esquema
+
+def get_influxdb_client():
+    host = os.environ.get('INFLUXDB_HOST', 'localhost')
+    port = int(os.environ.get('INFLUXDB_PORT', 8087))
+    username = os.environ.get('INFLUXDB_USER')
+    password = os.environ.get('INFLUXDB_USER_PASSWORD')
+    database = os.environ.get('INFLUXDB_DATABASE', 'metrics')
+    if username and password:
+        client = InfluxDBClient(host=host, port=port, username=username, password=password)
+    else:
+        client = InfluxDBClient(host=host, port=port)
+    client.switch_database(database)
+    return client
+
+def uso_disco(client, database):
+    """
+    Suma el tamaño en disco (bytes) de los shards de la base según SHOW STATS.
+    Retorna None si el servidor no expone la estadística.
+    """
+    try:
+        resultado = client.query("SHOW STATS FOR 'shard'")
+    except Exception as e:
+        print(f"Error obteniendo uso de disco: {e}")
+        return None
+    total = 0
+    encontrado = False
+    for (nombre, tags), puntos in resultado.items():
+        if (tags or {}).get('database') != database:
+            continue
+        for punto in puntos:
+            if punto.get('diskBytes') is not None:
+                total += int(punto['diskBytes'])
+                encontrado = True
+    return total if encontrado else None
+
+def rango_temporal(client, measurement, campo):
+    """
+    Retorna (inicio, fin) en segundos epoch de los puntos de una medición
+    """
+    primero = list(client.query(f'SELECT FIRST("{campo}") FROM "{measurement}"', epoch='s').get_points())
+    ultimo = list(client.query(f'SELECT LAST("{campo}") FROM "{measurement}"', epoch='s').get_points())
+    if not primero or not ultimo:
+        return None, None
+    return int(primero[0]['time']), int(ultimo[0]['time'])
+
+def contar(client, measurement, campo):
+    puntos = list(client.query(f'SELECT COUNT("{campo}") FROM "{measurement}"').get_points())
+    return int(puntos[0]['count']) if puntos else 0
+
+def contar_tramo(client, measurement, desde, hasta):
+    """
+    Cuenta los puntos de un tramo [desde, hasta) con cualquier campo, incluidos
+    los obsoletos. COUNT(*) cuenta por campo, se toma el mayor de cada serie.
+    """
+    resultado = client.query(f'SELECT COUNT(*) FROM "{measurement}" '
+                             f'WHERE time >= {desde}s AND time < {hasta}s GROUP BY *')
+    total = 0
+    for _, puntos in resultado.items():
+        for punto in puntos:
+            total += max((v for k, v in punto.items() if k.startswith('count_') and v), default=0)
+    return total
+
+def leer_tramo(client, measurement, desde, hasta):
+    """
+    Lee los puntos de un tramo [desde, hasta) con solo los campos y tags del esquema.
+    Puntos con igual serie dentro del mismo segundo se colapsan en uno.
+    """
+    esquema = obtener_esquema(measurement)
+    query = (f'SELECT {columnas(measurement, incluir_tags=False)} FROM "{measurement}" '
+             f'WHERE time >= {desde}s AND time < {hasta}s GROUP BY *')
+    resultado = client.query(query, epoch='s')
+    lote = []
+    for (_, tags), puntos in resultado.items():
+        tags = {k: v for k, v in (tags or {}).items() if k in esquema['tags'] and v}
+        for punto in puntos:
+            fields = {}
+            for nombre, tipo in esquema['campos'].items():
+                if punto.get(nombre) is not None:
+                    fields[nombre] = tipo(punto[nombre])
+            if not fields:
+                continue
+            nuevo = {"measurement": measurement, "time": int(punto['time']), "fields": fields}
+            if tags:
+                nuevo["tags"] = tags
+            lote.append(nuevo)
+    return lote
+
+def ruta_respaldo(dir_respaldo, measurement, desde, hasta):
+    return os.path.join(dir_respaldo, f"{measurement}_{desde}_{hasta}.json")
+
+def reescribir_tramo(client, measurement, desde, hasta, dir_respaldo):
+    """
+    Reescribe un tramo en el lugar: lo lee compactado, lo respalda en disco,
+    lo borra con DELETE y vuelve a escribirlo. El respaldo se elimina solo
+    cuando la escritura terminó bien. Lanza ValueError sin borrar nada si el
+    tramo tiene puntos que no se podrían reescribir.
+    """
+    lote = leer_tramo(client, measurement, desde, hasta)
+    # Puntos sin ningún campo del esquema no se leen; el DELETE los perdería
+    existentes = contar_tramo(client, measurement, desde, hasta)
+    if len(lote) != existentes:
+        raise ValueError(f"{measurement}: el tramo {desde}-{hasta} tiene {existentes} puntos "
+                         f"pero solo {len(lote)} tienen campos del esquema; no se borra nada")
+    if not lote:
+        return 0
+    respaldo = ruta_respaldo(dir_respaldo, measurement, desde, hasta)
+    with open(respaldo, 'w') as f:
+        json.dump(lote, f)
+    client.query(f'DELETE FROM "{measurement}" WHERE time >= {desde}s AND time < {hasta}s')
+    client.write_points(lote, time_precision=PRECISION_ESCRITURA, batch_size=5000)
+    os.remove(respaldo)
+    return len(lote)
+
+def restaurar_respaldos(client, measurement, dir_respaldo):
+    """
+    Vuelve a escribir los tramos que quedaron respaldados por una ejecución
+    interrumpida entre el DELETE y la escritura
+    """
+    restaurados = 0
+    for respaldo in sorted(glob.glob(os.path.join(dir_respaldo, f"{measurement}_*_*.json"))):
+        with open(respaldo) as f:
+            lote = json.load(f)
+        client.write_points(lote, time_precision=PRECISION_ESCRITURA, batch_size=5000)
+        os.remove(respaldo)
+        restaurados += len(lote)
+        print(f"  {measurement}: restaurado {os.path.basename(respaldo)} ({len(lote)} puntos)")
+    return restaurados
+
+def migrar_medicion(client, measurement, tramo, dir_respaldo, margen, dry_run=False, forzar=False):
+    """
+    Reescribe una medición al esquema compacto tramo por tramo. No toca los
+    últimos 'margen' segundos para no borrar puntos que un colector esté
+    escribiendo mientras corre la migración; basta con volver a ejecutarla.
+    Las mediciones sin campos obsoletos se omiten salvo con 'forzar'.
+    """
+    esquema = obtener_esquema(measurement)
+    campo = campo_conteo(measurement)
+    if not esquema['obsoletos'] and not forzar:
+        print(f"{measurement}: sin campos obsoletos en el esquema v{esquema['version']}, se omite (use --forzar)")
+        return
+    if not dry_run:
+        os.makedirs(dir_respaldo, exist_ok=True)
+        restaurar_respaldos(client, measurement, dir_respaldo)
+
+    inicio, fin = rango_temporal(client, measurement, campo)
+    if inicio is None:
+        print(f"{measurement}: sin datos, nada que migrar")
+        return
+    corte = min(fin + 1, int(time.time()) - margen)
+    if corte <= inicio:
+        print(f"{measurement}: todos los puntos están dentro del margen de {margen}s, nada que migrar")
+        return
+    total = contar(client, measurement, campo)
+    print(f"{measurement}: {total} registros entre "
+          f"{datetime.fromtimestamp(inicio, timezone.utc):%Y-%m-%d} y "
+          f"{datetime.fromtimestamp(corte, timezone.utc):%Y-%m-%d %H:%M} "
+          f"-> esquema v{esquema['version']} (se descartan: {', '.join(esquema['obsoletos']) or 'ninguno'})")
+    if dry_run:
+        return
+
+    desde = inicio
+    while desde < corte:
+        hasta = min(desde + tramo, corte)
+        reescritos = reescribir_tramo(client, measurement, desde, hasta, dir_respaldo)
+        print(f"  {measurement}: {datetime.fromtimestamp(desde, timezone.utc):%Y-%m-%d %H:%M} "
+              f"({reescritos} puntos)")
+        desde = hasta
+    notificar_escritura(measurement)
+    print(f"{measurement}: {total} registros antes, {contar(client, measurement, campo)} después")
+
+def formatear_bytes(valor):
+    if valor is None:
+        return "N/A"
+    for unidad in ['B', 'KB', 'MB', 'GB']:
+        if valor < 1024:
+            return f"{valor:.1f} {unidad}"
+        valor /= 1024
+    return f"{valor:.1f} TB"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migra las mediciones de InfluxDB al esquema compacto definido en esquema.py")
+    parser.add_argument('mediciones', nargs='*', default=list(ESQUEMAS), help="Mediciones a migrar (por defecto todas)")
+    parser.add_argument('--tramo-horas', type=int, default=24, help="Tamaño de cada tramo de reescritura en horas")
+    parser.add_argument('--margen-minutos', type=int, default=10, help="Minutos más recientes que no se reescriben")
+    parser.add_argument('--dir-respaldo', default='respaldo_migracion', help="Directorio de respaldos de tramos en curso")
+    parser.add_argument('--forzar', action='store_true', help="Reescribe también las mediciones sin campos obsoletos")
+    parser.add_argument('--dry-run', action='store_true', help="Solo muestra lo que se migraría")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    database = os.environ.get('INFLUXDB_DATABASE', 'metrics')
+    client = get_influxdb_client()
+
+    antes = uso_disco(client, database)
+    for measurement in args.mediciones:
+        try:
+            migrar_medicion(client, measurement, args.tramo_horas * 3600, args.dir_respaldo,
+                            args.margen_minutos * 60, dry_run=args.dry_run, forzar=args.forzar)
+        except ValueError as e:
+            print(f"Migración interrumpida: {e}")
+            return 1
+    despues = uso_disco(client, database)
+
+    print(f"Uso de disco de '{database}': antes {formatear_bytes(antes)}, después {formatear_bytes(despues)}")
+    print("Nota: InfluxDB libera el espacio al compactar los shards, el valor final puede bajar más tarde.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,45 +1,283 @@
+import os
+import sys
+import glob
 import time
+import queue
+import platform
+import threading
 from datetime import datetime
-from influxdb import InfluxDBClient
-import uuid
-
-#def leer_temperatura():
-#    # Simulación: reemplazá con lectura real si tenés sensor
-#    return 22.5
-
-def leer_temperatura():
-    with open("/sys/class/thermal/thermal_zone0/temp") as f:
-        temp_millic = int(f.read())
-    return temp_millic / 1000.0
-
-def escribir_en_influx(valor):
-    client = InfluxDBClient(host='localhost', port=8086)
-    client.switch_database('metrics')
-
-#    punto = [{
-#        "measurement": "temperatura",
-#        "time": datetime.utcnow().isoformat(),
-#        "fields": {"valor": valor}
-#    }]
-
-    punto = [{
-	   "measurement": "temperatura",
-	    "time": datetime.utcnow().isoformat(),
-	    "fields": {
-	        "valor": valor,
-	        "inserted_at": datetime.utcnow().isoformat(),
-	        "uuid": str(uuid.uuid4())
-	    },
-	    "tags": {
-	        "sensor": "raspi1"
-	    }
-    }]
-
-    client.write_points(punto)
-    print(f"[{datetime.now()}] Temperatura enviada: {valor}°C")
+
+# El esquema compartido vive en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esquema import PRECISION_ESCRITURA, crear_punto
+from cache_consultas import notificar_escritura
+
+# Raíz de sysfs (configurable para apuntar a un árbol falso en pruebas)
+SYSFS_ROOT = os.environ.get('SYSFS_ROOT', '/sys')
+# Segundos entre lecturas de los sensores
+INTERVALO_MUESTREO = float(os.environ.get('TEMP_INTERVALO_MUESTREO', 1))
+# Segundos de cada ventana de agregación (un punto por sensor y ventana)
+VENTANA_AGREGACION = int(os.environ.get('TEMP_VENTANA_AGREGACION', 60))
+# Segundos máximos de una escritura antes de darla por fallida
+TIMEOUT_INFLUX = float(os.environ.get('TEMP_TIMEOUT_INFLUX', 5))
+# Ventanas que se conservan en memoria si InfluxDB no está disponible
+MAX_PENDIENTES = 60
+# Segundos de espera tras una escritura fallida; se duplica en cada fallo hasta el máximo
+ESPERA_REINTENTO = 5
+ESPERA_MAXIMA_REINTENTO = 300
+
+def _leer_texto(ruta):
+    try:
+        with open(ruta) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+class Sensor:
+    """
+    Archivo de temperatura de sysfs que se mantiene abierto y se relee con pread()
+    """
+    def __init__(self, nombre, ruta):
+        self.nombre = nombre
+        self.ruta = ruta
+        self.fd = os.open(ruta, os.O_RDONLY)
+
+    def leer(self):
+        """
+        Retorna la temperatura en °C o None si el sensor no respondió
+        """
+        try:
+            # Una sola llamada al sistema: leer desde el offset 0 sin reabrir
+            return int(os.pread(self.fd, 32, 0)) / 1000.0
+        except (OSError, ValueError):
+            return None
+
+    def cerrar(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+def descubrir_sensores(raiz=SYSFS_ROOT):
+    """
+    Descubre las zonas térmicas y los sensores hwmon bajo la raíz de sysfs.
+    Retorna un diccionario nombre -> ruta del archivo de temperatura.
+    """
+    sensores = {}
+
+    for zona in sorted(glob.glob(os.path.join(raiz, 'class', 'thermal', 'thermal_zone*'))):
+        ruta = os.path.join(zona, 'temp')
+        if os.path.exists(ruta):
+            tipo = _leer_texto(os.path.join(zona, 'type')) or 'desconocido'
+            sensores[f"{os.path.basename(zona)}:{tipo}"] = ruta
+
+    # Algunas distribuciones tienen un directorio intermedio /device (igual que psutil)
+    entradas = glob.glob(os.path.join(raiz, 'class', 'hwmon', 'hwmon*', 'temp*_input'))
+    entradas += glob.glob(os.path.join(raiz, 'class', 'hwmon', 'hwmon*', 'device', 'temp*_input'))
+    for ruta in sorted(entradas):
+        directorio = os.path.dirname(ruta)
+        hwmon = directorio if os.path.basename(directorio).startswith('hwmon') else os.path.dirname(directorio)
+        nombre = _leer_texto(os.path.join(hwmon, 'name')) or _leer_texto(os.path.join(directorio, 'name')) or 'desconocido'
+        base = os.path.basename(ruta)[:-len('_input')]
+        etiqueta = _leer_texto(os.path.join(directorio, f"{base}_label")) or base
+        sensores[f"{os.path.basename(hwmon)}:{nombre}/{etiqueta}"] = ruta
+
+    return sensores
+
+class Agregado:
+    """
+    Mínimo, máximo, promedio y último valor de un sensor dentro de una ventana
+    """
+    def __init__(self):
+        self.minimo = None
+        self.maximo = None
+        self.suma = 0.0
+        self.muestras = 0
+        self.ultimo = None
+
+    def agregar(self, valor):
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+        self.suma += valor
+        self.muestras += 1
+        self.ultimo = valor
+
+    def campos(self):
+        return {
+            "valor": round(self.suma / self.muestras, 3),
+            "valor_min": self.minimo,
+            "valor_max": self.maximo,
+            "valor_ultimo": self.ultimo,
+            "muestras": self.muestras
+        }
+
+class Muestreador:
+    """
+    Lee todos los sensores en cada muestreo y agrega los valores por ventana de tiempo
+    """
+    def __init__(self, raiz=SYSFS_ROOT, ventana=VENTANA_AGREGACION, host=None):
+        self.ventana = ventana
+        self.host = host or platform.node()
+        self.sensores = []
+        for nombre, ruta in descubrir_sensores(raiz).items():
+            try:
+                self.sensores.append(Sensor(nombre, ruta))
+            except OSError as e:
+                print(f"Se omite el sensor {nombre} ({ruta}): {e}")
+        self.inicio_ventana = None
+        self.agregados = {}
+
+    def muestrear(self, ahora=None):
+        """
+        Lee todos los sensores. Si la lectura cae en una ventana nueva retorna
+        los puntos agregados de la ventana anterior, si no una lista vacía.
+        """
+        ahora = time.time() if ahora is None else ahora
+        inicio = int(ahora // self.ventana) * self.ventana
+        puntos = []
+        if self.inicio_ventana is not None and inicio != self.inicio_ventana:
+            puntos = self.cerrar_ventana()
+        self.inicio_ventana = inicio
+
+        for sensor in self.sensores:
+            valor = sensor.leer()
+            if valor is not None:
+                self.agregados.setdefault(sensor.nombre, Agregado()).agregar(valor)
+        return puntos
+
+    def cerrar_ventana(self):
+        """
+        Retorna los puntos de la ventana en curso y reinicia los agregados
+        """
+        puntos = [
+            crear_punto("temperatura", agregado.campos(),
+                        tags={"host": self.host, "sensor": nombre},
+                        tiempo=self.inicio_ventana)
+            for nombre, agregado in self.agregados.items() if agregado.muestras
+        ]
+        self.agregados = {}
+        return puntos
+
+    def cerrar(self):
+        for sensor in self.sensores:
+            sensor.cerrar()
+
+def get_influxdb_client():
+    from influxdb import InfluxDBClient
+    # Sin reintentos internos: lo que falle queda en 'pendientes' para el próximo ciclo
+    client = InfluxDBClient(host=os.environ.get('INFLUXDB_HOST', 'localhost'),
+                            port=int(os.environ.get('INFLUXDB_PORT', 8086)),
+                            timeout=TIMEOUT_INFLUX, retries=1)
+    client.switch_database(os.environ.get('INFLUXDB_DATABASE', 'metrics'))
+    return client
+
+def escribir_en_influx(client, puntos):
+    client.write_points(puntos, time_precision=PRECISION_ESCRITURA)
+    notificar_escritura("temperatura")
+    print(f"[{datetime.now()}] {len(puntos)} agregados de temperatura enviados")
+
+class Escritor:
+    """
+    Envía los puntos a InfluxDB desde un hilo propio para que una escritura lenta
+    o un servidor caído no frenen el muestreo a 1 Hz. Si la escritura falla
+    conserva los puntos (como máximo 'max_puntos') y reintenta con espera exponencial.
+    """
+    def __init__(self, client, max_puntos, espera_inicial=ESPERA_REINTENTO, espera_maxima=ESPERA_MAXIMA_REINTENTO):
+        self.client = client
+        self.max_puntos = max_puntos
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.cola = queue.Queue()
+        self.pendientes = []
+        self.espera = 0
+        self.proximo_intento = 0
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name='escritor-influx', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def encolar(self, puntos):
+        if puntos:
+            self.cola.put(puntos)
+
+    def recibir(self, timeout=None):
+        """
+        Pasa a 'pendientes' lo encolado, esperando como máximo 'timeout' segundos
+        """
+        try:
+            while True:
+                self.pendientes.extend(self.cola.get(timeout=timeout))
+                timeout = 0
+        except queue.Empty:
+            pass
+        # Conservar solo las ventanas más recientes
+        del self.pendientes[:-self.max_puntos]
+
+    def intentar(self, ahora=None):
+        """
+        Escribe los pendientes si ya pasó la espera del último fallo.
+        Retorna True si quedaron escritos.
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        if not self.pendientes or ahora < self.proximo_intento:
+            return False
+        try:
+            escribir_en_influx(self.client, self.pendientes)
+        except Exception as e:
+            self.espera = min(self.espera_maxima, self.espera * 2 if self.espera else self.espera_inicial)
+            self.proximo_intento = ahora + self.espera
+            print(f"[{datetime.now()}] Error escribiendo en InfluxDB: {e}; "
+                  f"{len(self.pendientes)} puntos pendientes, reintento en {self.espera}s")
+            return False
+        self.pendientes = []
+        self.espera = 0
+        self.proximo_intento = 0
+        return True
+
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            self.recibir(timeout=1)
+            self.intentar()
+
+    def cerrar(self, timeout=TIMEOUT_INFLUX):
+        """
+        Detiene el hilo y hace un último intento con lo que quede pendiente
+        """
+        self._detener.set()
+        self._hilo.join(timeout + 1)
+        if self._hilo.is_alive():
+            print("El escritor no terminó a tiempo, se descartan los puntos pendientes")
+            return
+        self.recibir(timeout=0)
+        self.proximo_intento = 0
+        self.intentar()
 
 if __name__ == "__main__":
-    while True:
-        temp = leer_temperatura()
-        escribir_en_influx(temp)
-        time.sleep(300)  # 5 minutos
+    muestreador = Muestreador()
+    if not muestreador.sensores:
+        print(f"No se encontraron sensores de temperatura en {SYSFS_ROOT}")
+        sys.exit(1)
+    print(f"Muestreando {len(muestreador.sensores)} sensores cada {INTERVALO_MUESTREO}s: "
+          f"{', '.join(s.nombre for s in muestreador.sensores)}")
+
+    escritor = Escritor(get_influxdb_client(), MAX_PENDIENTES * len(muestreador.sensores))
+    escritor.iniciar()
+    siguiente = time.monotonic()
+    try:
+        while True:
+            escritor.encolar(muestreador.muestrear())
+
+            siguiente += INTERVALO_MUESTREO
+            espera = siguiente - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                # Atrasados: reprogramar sin acumular lecturas
+                siguiente = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        escritor.encolar(muestreador.cerrar_ventana())
+        escritor.cerrar()
+        muestreador.cerrar()
@@ -1,11 +1,11 @@
 from influxdb import InfluxDBClient
+from esquema import PRECISION_ESCRITURA, crear_punto
+from cache_consultas import notificar_escritura
 
 client = InfluxDBClient(host='localhost', port=8087)
 client.switch_database('metrics')
 
-data = [{
-    "measurement": "temperatura",
-    "fields": {"valor": 23.5}
-}]
+data = [crear_punto("temperatura", {"valor": 23.5})]
 
-client.write_points(data)
+client.write_points(data, time_precision=PRECISION_ESCRITURA)
+notificar_escritura("temperatura")
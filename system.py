@@ -4,7 +4,10 @@ import json
 from datetime import datetime
 from influxdb import InfluxDBClient
 import os
+import time
 from dotenv import load_dotenv
+from esquema import PRECISION_ESCRITURA, crear_punto
+from cache_consultas import notificar_escritura
 
 load_dotenv()  # Carga las variables del archivo .env
 
@@ -43,30 +46,31 @@ def insertar_en_influx(info):
     db = os.environ.get('INFLUXDB_DATABASE', 'metrics')
     client = InfluxDBClient(host=host, port=port)
     client.switch_database(db)
-    punto = {
-        "measurement": "sistema_info",
-        "tags": {
+    punto = crear_punto(
+        "sistema_info",
+        {
+            "cpu_uso_porcentual": info["cpu"]["uso_porcentual"],
+            "cpu_nucleos_logicos": info["cpu"]["nucleos_logicos"],
+            "cpu_nucleos_fisicos": info["cpu"]["nucleos_fisicos"],
+            "ram_total": info["ram"]["total"],
+            "ram_disponible": info["ram"]["available"],
+            "ram_uso_porcentual": info["ram"]["percent"],
+            "disco_total": info["disco"]["total"],
+            "disco_usado": info["disco"]["used"],
+            "disco_libre": info["disco"]["free"],
+            "disco_uso_porcentual": info["disco"]["percent"],
+            "red_bytes_enviados": info["red"]["bytes_sent"],
+            "red_bytes_recibidos": info["red"]["bytes_recv"]
+        },
+        tags={
             "host": platform.node(),
             "sistema": platform.system(),
             "arquitectura": platform.machine()
         },
-        "time": info["timestamp"],
-        "fields": {
-            "cpu_uso_porcentual": float(info["cpu"]["uso_porcentual"]),
-            "cpu_nucleos_logicos": int(info["cpu"]["nucleos_logicos"]),
-            "cpu_nucleos_fisicos": int(info["cpu"]["nucleos_fisicos"]),
-            "ram_total": int(info["ram"]["total"]),
-            "ram_disponible": int(info["ram"]["available"]),
-            "ram_uso_porcentual": float(info["ram"]["percent"]),
-            "disco_total": int(info["disco"]["total"]),
-            "disco_usado": int(info["disco"]["used"]),
-            "disco_libre": int(info["disco"]["free"]),
-            "disco_uso_porcentual": float(info["disco"]["percent"]),
-            "red_bytes_enviados": int(info["red"]["bytes_sent"]),
-            "red_bytes_recibidos": int(info["red"]["bytes_recv"])
-        }
-    }
-    client.write_points([punto])
+        tiempo=datetime.fromisoformat(info["timestamp"])
+    )
+    client.write_points([punto], time_precision=PRECISION_ESCRITURA)
+    notificar_escritura("sistema_info")
 
 if __name__ == "__main__":
     while True:
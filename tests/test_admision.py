@@ -0,0 +1,121 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+flask = pytest.importorskip('flask')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import admision
+from admision import ClaseCosto, ControlAdmision, LimitadorTasa, limitar
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 100.0
+
+    def __call__(self):
+        return self.ahora
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(admision.time, 'monotonic', reloj)
+    return reloj
+
+def crear_app(monkeypatch, **env):
+    for nombre, valor in env.items():
+        monkeypatch.setenv(nombre, valor)
+    app = flask.Flask(__name__)
+    app.extensions['admision'] = ControlAdmision()
+
+    @app.route('/pesada')
+    @limitar('pesada')
+    def pesada():
+        return 'ok'
+
+    return app
+
+def test_token_bucket_rafaga_y_recarga(reloj):
+    limitador = LimitadorTasa(tasa=2.0, rafaga=3)
+    assert [limitador.consumir('a') for _ in range(3)] == [0, 0, 0]
+    assert limitador.consumir('a') == pytest.approx(0.5)
+    # Otro cliente tiene su propia cubeta
+    assert limitador.consumir('b') == 0
+
+    reloj.ahora += 0.5
+    assert limitador.consumir('a') == 0
+    assert limitador.consumir('a') > 0
+
+    # La recarga no supera la ráfaga
+    reloj.ahora += 60
+    assert [limitador.consumir('a') for _ in range(4)][-1] > 0
+
+def test_cola_llena_rechaza_sin_esperar():
+    clase = ClaseCosto('pesada', concurrencia=1, cola=0, espera=10, tasa=0, rafaga=1)
+    assert clase.adquirir()
+    assert not clase.adquirir()
+    clase.liberar()
+    assert clase.adquirir()
+    assert clase.estadisticas()['rechazadas_cola'] == 1
+
+def test_espera_agotada():
+    clase = ClaseCosto('pesada', concurrencia=1, cola=1, espera=0.05, tasa=0, rafaga=1)
+    assert clase.adquirir()
+    assert not clase.adquirir()
+    estadisticas = clase.estadisticas()
+    assert (estadisticas['rechazadas_espera'], estadisticas['en_cola']) == (1, 0)
+
+def test_espera_admitida_al_liberar():
+    clase = ClaseCosto('pesada', concurrencia=1, cola=1, espera=5, tasa=0, rafaga=1)
+    assert clase.adquirir()
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(clase.adquirir()))
+    hilo.start()
+    while clase.estadisticas()['en_cola'] == 0:
+        time.sleep(0.001)
+    clase.liberar()
+    hilo.join(5)
+    assert resultado == [True]
+    assert clase.estadisticas()['en_curso'] == 1
+
+def test_429_con_retry_after(monkeypatch):
+    app = crear_app(monkeypatch, ADMISION_PESADA_TASA='0.5', ADMISION_PESADA_RAFAGA='1')
+    cliente = app.test_client()
+    assert cliente.get('/pesada').status_code == 200
+
+    respuesta = cliente.get('/pesada')
+    assert respuesta.status_code == 429
+    assert respuesta.headers['Retry-After'] == '2'
+    assert respuesta.get_json()['reintentar_en'] == 2
+
+def test_503_con_cola_llena(monkeypatch):
+    app = crear_app(monkeypatch, ADMISION_PESADA_TASA='0', ADMISION_PESADA_COLA='0')
+    app.extensions['admision'].clases['pesada'].adquirir()
+
+    respuesta = app.test_client().get('/pesada')
+    assert respuesta.status_code == 503
+    assert respuesta.headers['Retry-After'] == '10'
+
+def test_deshabilitado_no_limita(monkeypatch):
+    app = crear_app(monkeypatch, ADMISION_HABILITADA='false', ADMISION_PESADA_RAFAGA='1')
+    cliente = app.test_client()
+    assert [cliente.get('/pesada').status_code for _ in range(5)] == [200] * 5
+
+@pytest.mark.parametrize('remota, cabeceras, esperado', [
+    # Sin proxy confiable las cabeceras se ignoran
+    ('203.0.113.5', {'X-Real-IP': '10.0.0.1'}, '203.0.113.5'),
+    ('172.28.0.10', {'X-Real-IP': '198.51.100.7'}, '198.51.100.7'),
+    # De X-Forwarded-For solo vale la entrada que agregó nginx (la última)
+    ('172.28.0.10', {'X-Forwarded-For': '10.0.0.1, 198.51.100.7'}, '198.51.100.7'),
+    ('172.28.0.10', {}, '172.28.0.10'),
+])
+def test_identificar_cliente(monkeypatch, remota, cabeceras, esperado):
+    monkeypatch.setenv('ADMISION_PROXIES_CONFIABLES', '172.28.0.0/16, no-es-una-red')
+    control = ControlAdmision()
+    assert [str(red) for red in control.proxies_confiables] == ['172.28.0.0/16']
+
+    app = flask.Flask(__name__)
+    with app.test_request_context('/', headers=cabeceras, environ_base={'REMOTE_ADDR': remota}):
+        assert control.identificar_cliente() == esperado
@@ -0,0 +1,143 @@
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cache_consultas
+from cache_consultas import CacheConsultas, BackendSQLite
+
+class Resultado:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def get_points(self):
+        serie = self.raw['series'][0] if self.raw.get('series') else None
+        if not serie:
+            return iter([])
+        return iter(dict(zip(serie['columns'], fila)) for fila in serie['values'])
+
+def resultado(filas, columnas=('time', 'valor')):
+    return Resultado({'statement_id': 0, 'series': [
+        {'name': 'temperatura', 'columns': list(columnas), 'values': [list(f) for f in filas]}
+    ]})
+
+class ClienteFalso:
+    """
+    Responde la sonda LAST() con 'ultimo' y cualquier otra consulta con 'filas'
+    """
+    def __init__(self, filas):
+        self.filas = filas
+        self.ultimo = 1000
+        self.consultas = []
+
+    def query(self, query, **kwargs):
+        if 'LAST(' in query:
+            return resultado([(self.ultimo, 1.0)], ('time', 'last'))
+        self.consultas.append(query)
+        return resultado(self.filas)
+
+def crear_cache(**kwargs):
+    opciones = dict(habilitada=True, max_entradas=10, max_bytes=1024 * 1024, max_bytes_entrada=64 * 1024,
+                    intervalo_sondeo=0, ruta_sqlite=None, dir_notificaciones=None)
+    opciones.update(kwargs)
+    return CacheConsultas(**opciones)
+
+def consulta(n):
+    return f'SELECT "valor" FROM temperatura LIMIT {n}'
+
+def test_acierto_e_invalidacion_por_escritura():
+    cache = crear_cache()
+    client = ClienteFalso([(1, 20.0)])
+
+    primero = cache.consultar(client, consulta(1))
+    assert cache.consultar(client, '  SELECT "valor"  FROM temperatura LIMIT 1') is primero
+    assert len(client.consultas) == 1
+
+    # Un punto más nuevo cambia la versión y la entrada deja de servirse
+    client.ultimo = 2000
+    cache.consultar(client, consulta(1))
+    assert len(client.consultas) == 2
+
+    estadisticas = cache.estadisticas()
+    assert (estadisticas['aciertos'], estadisticas['fallos']) == (1, 2)
+    assert estadisticas['ratio_aciertos'] == round(1 / 3, 4)
+
+def test_notificacion_invalida_sin_punto_nuevo(tmp_path, monkeypatch):
+    monkeypatch.setenv('CACHE_DIR_NOTIFICACIONES', str(tmp_path))
+    cache = crear_cache(dir_notificaciones=str(tmp_path))
+    client = ClienteFalso([(1, 20.0)])
+
+    cache.consultar(client, consulta(1))
+    cache_consultas.notificar_escritura('temperatura')
+    ruta = tmp_path / 'temperatura.escritura'
+    os.utime(ruta, ns=(ruta.stat().st_mtime_ns + 10 ** 9,) * 2)
+    cache.consultar(client, consulta(1))
+    assert len(client.consultas) == 2
+
+def test_mediciones_sin_esquema_no_se_cachean():
+    cache = crear_cache()
+    client = ClienteFalso([(1, 20.0)])
+    cache.consultar(client, 'SHOW MEASUREMENTS')
+    cache.consultar(client, 'SHOW MEASUREMENTS')
+    assert len(client.consultas) == 2
+    assert cache.estadisticas()['entradas'] == 0
+
+def test_limite_de_entradas_descarta_la_menos_usada():
+    cache = crear_cache(max_entradas=2)
+    client = ClienteFalso([(1, 20.0)])
+    cache.consultar(client, consulta(1))
+    cache.consultar(client, consulta(2))
+    cache.consultar(client, consulta(1))
+    cache.consultar(client, consulta(3))
+
+    assert cache.estadisticas()['entradas'] == 2
+    cache.consultar(client, consulta(1))
+    assert len(client.consultas) == 3
+    cache.consultar(client, consulta(2))
+    assert len(client.consultas) == 4
+
+def test_limite_de_bytes():
+    client = ClienteFalso([(i, 20.0) for i in range(50)])
+    tamano = len(cache_consultas.json.dumps(client.query(consulta(0)).raw))
+    client.consultas = []
+    cache = crear_cache(max_bytes=tamano * 2)
+
+    for n in range(4):
+        cache.consultar(client, consulta(n))
+    estadisticas = cache.estadisticas()
+    assert estadisticas['entradas'] == 2
+    assert estadisticas['bytes'] == tamano * 2
+
+def test_resultados_grandes_no_se_guardan(monkeypatch):
+    cache = crear_cache(max_bytes_entrada=1024)
+    client = ClienteFalso([(i, 20.0) for i in range(1000)])
+    serializados = []
+    dumps = cache_consultas.json.dumps
+    monkeypatch.setattr(cache_consultas.json, 'dumps', lambda obj, **kw: serializados.append(obj) or dumps(obj, **kw))
+
+    cache.consultar(client, 'SELECT "valor" FROM temperatura')
+    # Solo se serializa la clave, no el resultado que seguro excede el límite
+    assert all(not isinstance(obj, dict) for obj in serializados)
+    estadisticas = cache.estadisticas()
+    assert (estadisticas['no_guardadas'], estadisticas['entradas']) == (1, 0)
+
+def test_backend_compartido_entre_instancias(tmp_path):
+    ruta = str(tmp_path / 'cache.sqlite')
+    backend = BackendSQLite(ruta)
+    backend.guardar('a', 'v1', '{"x": 1}', max_entradas=10, max_bytes=1024)
+    assert BackendSQLite(ruta).obtener('a', 'v1') == '{"x": 1}'
+    assert backend.obtener('a', 'v2') is None
+
+def test_backend_compartido_con_error_no_falla_la_consulta(tmp_path):
+    cache = crear_cache(ruta_sqlite=str(tmp_path / 'cache.sqlite'))
+
+    def bloqueada():
+        raise sqlite3.OperationalError('database is locked')
+
+    cache.compartido._conexion = bloqueada
+    client = ClienteFalso([(1, 20.0)])
+    assert list(cache.consultar(client, consulta(1)).get_points()) == [{'time': 1, 'valor': 20.0}]
+    assert cache.estadisticas()['errores_compartido'] == 2
+    # El resultado quedó igual en la cache en memoria
+    cache.consultar(client, consulta(1))
+    assert len(client.consultas) == 1
@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'services'))
+import temp_daemon
+
+def escribir(ruta, contenido):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(contenido + "\n")
+
+def crear_sysfs(raiz):
+    """
+    Arma un árbol sysfs falso con una zona térmica, un hwmon y un hwmon con /device
+    """
+    escribir(raiz / 'class/thermal/thermal_zone0/temp', '45000')
+    escribir(raiz / 'class/thermal/thermal_zone0/type', 'cpu-thermal')
+    escribir(raiz / 'class/hwmon/hwmon0/name', 'cpu_thermal')
+    escribir(raiz / 'class/hwmon/hwmon0/temp1_input', '46000')
+    escribir(raiz / 'class/hwmon/hwmon1/name', 'nvme')
+    escribir(raiz / 'class/hwmon/hwmon1/device/temp1_input', '30000')
+    escribir(raiz / 'class/hwmon/hwmon1/device/temp1_label', 'Composite')
+
+def test_descubrir_sensores(tmp_path):
+    crear_sysfs(tmp_path)
+    sensores = temp_daemon.descubrir_sensores(str(tmp_path))
+    assert sensores == {
+        'thermal_zone0:cpu-thermal': str(tmp_path / 'class/thermal/thermal_zone0/temp'),
+        'hwmon0:cpu_thermal/temp1': str(tmp_path / 'class/hwmon/hwmon0/temp1_input'),
+        'hwmon1:nvme/Composite': str(tmp_path / 'class/hwmon/hwmon1/device/temp1_input'),
+    }
+
+def test_descubrir_sensores_sin_sysfs(tmp_path):
+    assert temp_daemon.descubrir_sensores(str(tmp_path)) == {}
+
+def test_muestrear_agrega_por_ventana(tmp_path):
+    crear_sysfs(tmp_path)
+    zona = tmp_path / 'class/thermal/thermal_zone0/temp'
+    muestreador = temp_daemon.Muestreador(str(tmp_path), ventana=60, host='pi')
+    try:
+        # Ventana [600, 660): 30 lecturas a 45 °C y 30 a 50 °C
+        for segundo in range(600, 660):
+            if segundo == 630:
+                zona.write_text('50000\n')
+            assert muestreador.muestrear(segundo) == []
+
+        # La primera lectura de la ventana siguiente cierra la anterior
+        puntos = muestreador.muestrear(660)
+    finally:
+        muestreador.cerrar()
+
+    por_sensor = {p['tags']['sensor']: p for p in puntos}
+    assert set(por_sensor) == {'thermal_zone0:cpu-thermal', 'hwmon0:cpu_thermal/temp1', 'hwmon1:nvme/Composite'}
+    zona0 = por_sensor['thermal_zone0:cpu-thermal']
+    assert zona0['time'] == 600
+    assert zona0['tags']['host'] == 'pi'
+    assert zona0['fields'] == {
+        'valor': 47.5,
+        'valor_min': 45.0,
+        'valor_max': 50.0,
+        'valor_ultimo': 50.0,
+        'muestras': 60,
+    }
+    assert por_sensor['hwmon1:nvme/Composite']['fields']['valor'] == 30.0
+
+def test_sensor_ilegible_se_omite(tmp_path, monkeypatch):
+    crear_sysfs(tmp_path)
+    abrir = os.open
+
+    def abrir_con_error(ruta, *args, **kwargs):
+        if ruta.endswith('hwmon0/temp1_input'):
+            raise PermissionError(13, 'Permission denied', ruta)
+        return abrir(ruta, *args, **kwargs)
+
+    monkeypatch.setattr(temp_daemon.os, 'open', abrir_con_error)
+    muestreador = temp_daemon.Muestreador(str(tmp_path), ventana=60, host='pi')
+    try:
+        assert [s.nombre for s in muestreador.sensores] == ['thermal_zone0:cpu-thermal', 'hwmon1:nvme/Composite']
+    finally:
+        muestreador.cerrar()
+
+class ClienteFalso:
+    def __init__(self, fallos=0, bloqueo=None):
+        self.fallos = fallos
+        self.bloqueo = bloqueo
+        self.escritos = []
+
+    def write_points(self, puntos, **kwargs):
+        if self.bloqueo:
+            self.bloqueo.wait()
+        if self.fallos:
+            self.fallos -= 1
+            raise ConnectionError('InfluxDB no responde')
+        self.escritos.append(list(puntos))
+
+def test_escritor_reintenta_con_espera_exponencial():
+    client = ClienteFalso(fallos=2)
+    escritor = temp_daemon.Escritor(client, max_puntos=3, espera_inicial=5, espera_maxima=8)
+    for n in range(4):
+        escritor.encolar([{'n': n}])
+    escritor.recibir(timeout=0)
+    # Solo se conservan los puntos más recientes
+    assert escritor.pendientes == [{'n': 1}, {'n': 2}, {'n': 3}]
+
+    assert not escritor.intentar(ahora=100)
+    assert (escritor.espera, escritor.proximo_intento) == (5, 105)
+    # Durante la espera no se vuelve a intentar
+    assert not escritor.intentar(ahora=104)
+    assert client.fallos == 1
+    assert not escritor.intentar(ahora=105)
+    assert (escritor.espera, escritor.proximo_intento) == (8, 113)
+
+    assert escritor.intentar(ahora=113)
+    assert client.escritos == [[{'n': 1}, {'n': 2}, {'n': 3}]]
+    assert (escritor.pendientes, escritor.espera) == ([], 0)
+
+def test_escritura_lenta_no_bloquea_al_muestreo():
+    bloqueo = threading.Event()
+    client = ClienteFalso(bloqueo=bloqueo)
+    escritor = temp_daemon.Escritor(client, max_puntos=100)
+    escritor.iniciar()
+    escritor.encolar([{'n': 0}])
+    # El hilo escritor queda detenido en write_points; encolar sigue sin esperar
+    inicio = time.monotonic()
+    for n in range(1, 5):
+        escritor.encolar([{'n': n}])
+    assert time.monotonic() - inicio < 0.5
+
+    bloqueo.set()
+    escritor.cerrar(timeout=1)
+    assert [p for lote in client.escritos for p in lote] == [{'n': n} for n in range(5)]